@@ -2,19 +2,56 @@ import sys
 import random
 import pickle
 import traceback
+import threading
+import queue
+import base64
+import struct
+import zlib
 import tkinter
 
+import numpy
+
 import nm_pathfinder
+import nm_pagedmesh
 
-if len(sys.argv) != 4:
-    print("usage: %s map.gif map.mesh.pickle subsample_factor" % sys.argv[0])
+def usage():
+    print("usage: %s map.gif map.mesh.pickle subsample_factor [clearance=N] [max_bytes=N] [threaded]" % sys.argv[0])
     sys.exit(-1)
 
-_, MAP_FILENAME, MESH_FILENAME, SUBSAMPLE = sys.argv
-SUBSAMPLE = int(SUBSAMPLE)
+if len(sys.argv) < 4:
+    usage()
+
+MAP_FILENAME, MESH_FILENAME, SUBSAMPLE = sys.argv[1:4]
+THREADED = False
+CLEARANCE = None
+MAX_BYTES = None
+try:
+    SUBSAMPLE = int(SUBSAMPLE)
+    for arg in sys.argv[4:]:
+        if arg == 'threaded' and not THREADED:
+            THREADED = True
+        elif arg.startswith('clearance=') and CLEARANCE is None:
+            CLEARANCE = float(arg[len('clearance='):])
+        elif arg.startswith('max_bytes=') and MAX_BYTES is None:
+            MAX_BYTES = int(arg[len('max_bytes='):])
+        else:
+            usage()
+except ValueError:
+    usage()
+if CLEARANCE is None:
+    CLEARANCE = 0
 
-with open(MESH_FILENAME, 'rb') as f:
-  mesh = pickle.load(f)
+if MESH_FILENAME.endswith('.paged'):
+  if MAX_BYTES is None:
+    mesh = nm_pagedmesh.PagedMesh(MESH_FILENAME)
+  else:
+    mesh = nm_pagedmesh.PagedMesh(MESH_FILENAME, MAX_BYTES)
+elif MAX_BYTES is not None:
+  print("max_bytes only applies to .paged meshes")
+  usage()
+else:
+  with open(MESH_FILENAME, 'rb') as f:
+    mesh = pickle.load(f)
 
 master = tkinter.Tk()
 
@@ -30,60 +67,198 @@ canvas.pack()
 def shrink(values):
     return [v/SUBSAMPLE for v in values]
 
+
+def png_data(rgba):
+    """Encode an RGBA buffer as base64 PNG data that PhotoImage can load"""
+    height, width, _ = rgba.shape
+    # every PNG row starts with a filter byte, 0 meaning unfiltered
+    rows = numpy.concatenate([numpy.zeros((height, 1), dtype=numpy.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    png = (b'\x89PNG\r\n\x1a\n'
+           + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+           + chunk(b'IDAT', zlib.compress(rows.tobytes()))
+           + chunk(b'IEND', b''))
+    return base64.b64encode(png).decode('ascii')
+
+
+def rasterize(boxes, color):
+    """
+    Draw box outlines into a transparent buffer and return it as PNG data.
+
+    This only touches numpy, so it can run on the search thread; the Tk thread
+    then loads the whole layer with a single PhotoImage call.
+    """
+    buffer = numpy.zeros((SMALL_HEIGHT, SMALL_WIDTH, 4), dtype=numpy.uint8)
+    for box in boxes:
+        x1,x2,y1,y2 = [int(v) for v in shrink(box)]
+        x2 = max(min(x2, SMALL_HEIGHT), x1 + 1)
+        y2 = max(min(y2, SMALL_WIDTH), y1 + 1)
+        buffer[x1, y1:y2] = color
+        buffer[x2-1, y1:y2] = color
+        buffer[x1:x2, y1] = color
+        buffer[x1:x2, y2-1] = color
+    return png_data(buffer)
+
+
+GRAY = (128, 128, 128, 255)
+PINK = (255, 192, 203, 255)
+
+
 source_point = None
 destination_point = None
 visited_boxes = []
 path = []
 
+# the map and mesh overlay never change, so they are drawn once;
+# press 'm' to toggle the mesh overlay
+canvas.create_image((0,0), anchor=tkinter.NW, image=small_image)
+
+mesh_image = tkinter.PhotoImage(width=SMALL_WIDTH, height=SMALL_HEIGHT)
+layer = nm_pathfinder.select_layer(mesh, CLEARANCE)
+if layer is None:
+    print("No mesh layer has clearance %g, the mesh overlay is unavailable." % CLEARANCE)
+elif 'boxes' in layer:
+    mesh_image = tkinter.PhotoImage(data=rasterize(layer['boxes'], GRAY), format='png')
+else:
+    print("Paged meshes have no box list, the mesh overlay is unavailable.")
+mesh_item = canvas.create_image((0,0), anchor=tkinter.NW, image=mesh_image, state=tkinter.HIDDEN)
+
+# visited boxes are rasterized into one image instead of one canvas item each
+blank_image = tkinter.PhotoImage(width=SMALL_WIDTH, height=SMALL_HEIGHT)
+visited_image = blank_image
+visited_item = canvas.create_image((0,0), anchor=tkinter.NW, image=visited_image)
+
+path_item = None
+source_item = None
+destination_item = None
+
+
+def draw_marker(point):
+    x,y = shrink(point)
+    return canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red')
+
 
-def redraw():
+def draw_result(visited_data):
 
-    canvas.delete(tkinter.ALL)
-    canvas.create_image((0,0), anchor=tkinter.NW, image=small_image)
+    global path_item, visited_image
 
-    for box in visited_boxes:
-        x1,x2,y1,y2 = shrink(box)
-        canvas.create_rectangle(y1,x1,y2,x2,outline='pink')
+    visited_image = tkinter.PhotoImage(data=visited_data, format='png')
+    canvas.itemconfigure(visited_item, image=visited_image)
 
-    for i in range(len(path) - 1):
-        x1, y1 = shrink(path[i])
-        x2, y2 = shrink(path[i + 1])
-        canvas.create_line(y1,x1,y2,x2,width=2.0,fill='red')
+    if len(path) > 1:
+        coords = []
+        for point in path:
+            x,y = shrink(point)
+            coords.extend((y,x))
+        path_item = canvas.create_line(*coords,width=2.0,fill='red')
 
-    if source_point:
-        x,y = shrink(source_point)
-        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red')
+    # cache counters for sizing max_bytes on paged meshes
+    if isinstance(mesh, nm_pagedmesh.PagedMesh):
+        print("page faults: %d, evictions: %d, cached bytes: %d" % (mesh.page_faults, mesh.evictions, mesh.cached_bytes))
 
-    if destination_point:
-        x,y = shrink(destination_point)
-        canvas.create_oval(y-5,x-5,y+5,x+5,width=2,outline='red')
+
+def clear_result():
+
+    global path_item, source_item, destination_item, visited_image
+
+    visited_image = blank_image
+    canvas.itemconfigure(visited_item, image=visited_image)
+    for item in (path_item, source_item, destination_item):
+        if item is not None:
+            canvas.delete(item)
+    path_item = source_item = destination_item = None
+
+
+# each search gets a number so results of searches that were reset are dropped,
+# and its own stop event so a stale search gives up instead of running to the end
+search_id = 0
+search_stop = threading.Event()
+results = queue.Queue()
+
+
+def cancel_search():
+    global search_id, search_stop
+    search_stop.set()
+    search_stop = threading.Event()
+    search_id += 1
+
+
+def search(my_id, stop, source, destination):
+    try:
+        found_path, found_boxes = nm_pathfinder.find_path(source, destination, mesh, CLEARANCE, stop)
+        if not stop.is_set():
+            results.put((my_id, found_path, found_boxes, rasterize(found_boxes, PINK)))
+    except:
+        traceback.print_exc()
+        results.put((my_id, None, None, None))
+
+
+def poll_results():
+
+    global destination_point, destination_item, visited_boxes, path
+
+    while not results.empty():
+        my_id, found_path, found_boxes, visited_data = results.get()
+        if my_id != search_id:
+            continue
+        if found_path is None:
+            destination_point = None
+            canvas.delete(destination_item)
+            destination_item = None
+        else:
+            path, visited_boxes = found_path, found_boxes
+            draw_result(visited_data)
+
+    master.after(50, poll_results)
 
 
 def on_click(event):
 
     global source_point, destination_point, visited_boxes, path
+    global source_item, destination_item
 
     if source_point and destination_point:
         source_point = None
         destination_point = None
         visited_boxes = []
         path = []
+        cancel_search()
+        clear_result()
 
     elif not source_point:
         source_point = event.y*SUBSAMPLE, event.x*SUBSAMPLE
+        source_item = draw_marker(source_point)
 
     else:
         destination_point = event.y*SUBSAMPLE, event.x*SUBSAMPLE
-        try:
-            path, visited_boxes = nm_pathfinder.find_path(source_point, destination_point, mesh)
+        destination_item = draw_marker(destination_point)
+        cancel_search()
+        if THREADED:
+            threading.Thread(target=search, args=(search_id, search_stop, source_point, destination_point), daemon=True).start()
+        else:
+            try:
+                path, visited_boxes = nm_pathfinder.find_path(source_point, destination_point, mesh, CLEARANCE)
+                draw_result(rasterize(visited_boxes, PINK))
 
-        except:
-            destination_point = None
-            traceback.print_exc()
+            except:
+                destination_point = None
+                canvas.delete(destination_item)
+                destination_item = None
+                traceback.print_exc()
 
-    redraw()
+
+def on_key(event):
+    if canvas.itemcget(mesh_item, 'state') == tkinter.HIDDEN:
+        canvas.itemconfigure(mesh_item, state=tkinter.NORMAL)
+    else:
+        canvas.itemconfigure(mesh_item, state=tkinter.HIDDEN)
 
 canvas.bind('<Button-1>', on_click)
+master.bind('m', on_key)
 
-redraw()
+if THREADED:
+    poll_results()
 master.mainloop()
@@ -125,24 +125,117 @@ def build_mesh(image, min_feature_size):
     return mesh
 
 
+def distance_transform(image, max_radius):
+    """Euclidean distance from every pixel to the nearest non-walkable pixel.
+
+    Pixels outside the image count as non-walkable, so the map border acts
+    as a wall. Non-walkable pixels get distance 0. Distances are only exact
+    up to max_radius + 1; anything farther away is reported as at least that,
+    which is all the clearance masks need.
+    """
+    blocked = image != 255
+    height, width = image.shape
+    limit = int(numpy.ceil(max_radius)) + 1
+
+    # first pass: distance to the nearest blocked pixel in the same column
+    column = numpy.zeros((height, width), dtype=numpy.float64)
+    run = numpy.zeros(width, dtype=numpy.float64)
+    for i in range(height):
+        run = numpy.where(blocked[i], 0, numpy.minimum(run + 1, limit))
+        column[i] = run
+    run = numpy.zeros(width, dtype=numpy.float64)
+    for i in range(height - 1, -1, -1):
+        run = numpy.where(blocked[i], 0, numpy.minimum(run + 1, limit))
+        column[i] = numpy.minimum(column[i], run)
+
+    # second pass: combine the column distances of nearby pixels in each row,
+    # padding both sides with blocked columns for the map border
+    squared = numpy.pad(column ** 2, ((0, 0), (limit, limit)))
+    dist = numpy.full((height, width), float(limit ** 2))
+    for offset in range(-limit, limit + 1):
+        shifted = squared[:, limit + offset:limit + offset + width]
+        numpy.minimum(dist, shifted + offset ** 2, out=dist)
+
+    return numpy.sqrt(dist)
+
+
+def build_layered_mesh(image, min_feature_size, radii):
+    """Build one mesh layer per clearance radius from a single distance transform.
+
+    A pixel is walkable in the layer for radius r when the nearest
+    non-walkable pixel is farther than r. Radii that produce the same walkable mask share
+    the same mesh. Raises ValueError if radii is empty or has a negative radius.
+    """
+    if not radii or min(radii) < 0:
+        raise ValueError("radii must be a non-empty list of non-negative numbers: %r" % (radii,))
+
+    dist = distance_transform(image, max(radii))
+
+    layers = {}
+    last_mask = None
+    last_mesh = None
+    for radius in sorted(set(radii)):
+        mask = dist > radius
+        if last_mask is None or not numpy.array_equal(mask, last_mask):
+            layer_image = numpy.where(mask, 255, 0).astype(numpy.uint8)
+            last_mesh = build_mesh(layer_image, min_feature_size)
+            last_mask = mask
+        layers[radius] = last_mesh
+
+    mesh = {'radii': sorted(layers), 'layers': layers}
+
+    return mesh
+
+
 if __name__ == '__main__':
 
     min_feature_size = 16
     filename = None
+    radii = None
 
     if len(sys.argv) == 2:
         filename = sys.argv[1]
     elif len(sys.argv) == 3:
         filename = sys.argv[1]
         min_feature_size = int(sys.argv[2])
+    elif len(sys.argv) == 4:
+        filename = sys.argv[1]
+        min_feature_size = int(sys.argv[2])
+        try:
+            radii = [int(r) for r in sys.argv[3].split(',')]
+        except ValueError:
+            radii = []
+        if not radii or min(radii) < 0:
+            print("usage: %s map_filename min_feature_size [radius,radius,...]" % sys.argv[0])
+            print("radii must be non-negative integers")
+            sys.exit(-1)
     else:
-        print("usage: %s map_filename min_feature_size" % sys.argv[0])
+        print("usage: %s map_filename min_feature_size [radius,radius,...]" % sys.argv[0])
         sys.exit(-1)
 
     img = (imread(filename) * 255).astype(dtype=numpy.uint8)
     if len(img.shape) > 2:
         img = img[:, :, 0]
 
+    if radii is not None:
+
+        mesh = build_layered_mesh(img, min_feature_size, radii)
+
+        with open(filename + '.mesh.pickle', 'wb') as f:
+            pickle.dump(mesh, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        for radius in mesh['radii']:
+            layer = mesh['layers'][radius]
+            atlas = zeros_like(img)
+            for x1, x2, y1, y2 in layer['boxes']:
+                atlas[x1:x2, y1:y2] = random.randint(64, 255)
+
+            imsave(filename + '.mesh.r%d.png' % radius, atlas)
+
+            print("Built a layer for radius %d with %d boxes." % (radius, len(layer['boxes'])))
+
+        sys.exit(0)
+
     mesh = build_mesh(img, min_feature_size)
 
     print(type(mesh))
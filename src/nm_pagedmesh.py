@@ -0,0 +1,183 @@
+import collections
+import pickle
+import struct
+import sys
+import threading
+
+
+def page_of(point, page_size):
+    """Find the page key for a point"""
+    x, y = point
+    return x // page_size, y // page_size
+
+
+def memory_size(obj, seen=None):
+    """Rough number of bytes an unpickled page takes, counting shared objects once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += memory_size(key, seen) + memory_size(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += memory_size(item, seen)
+    return size
+
+
+def write_paged_mesh(mesh, filename, page_size):
+    """
+    Splits a mesh into square spatial pages and writes them to one file.
+
+    Each box is owned by the page holding its (x1, y1) corner, and that page
+    stores its adjacency list. Neighbors owned by other pages are kept as plain
+    box tuples, which act as stubs: looking them up loads their own page.
+    Each page also lists every box overlapping it so points can be located
+    without loading the whole mesh. The index records each page's position in
+    the file and how much memory it takes once loaded.
+    """
+    pages = collections.defaultdict(lambda: {'adj': {}, 'covers': []})
+
+    for box in mesh['boxes']:
+        x1, x2, y1, y2 = box
+        pages[page_of((x1, y1), page_size)]['adj'][box] = mesh['adj'][box]
+        for i in range(x1 // page_size, x2 // page_size + 1):
+            for j in range(y1 // page_size, y2 // page_size + 1):
+                pages[(i, j)]['covers'].append(box)
+
+    with open(filename, 'wb') as f:
+        index = {}
+        for key, page in pages.items():
+            offset = f.tell()
+            data = pickle.dumps(page, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(data)
+            index[key] = (offset, len(data), memory_size(pickle.loads(data)))
+
+        index_offset = f.tell()
+        pickle.dump({'page_size': page_size, 'pages': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(struct.pack('<Q', index_offset))
+
+    return len(pages)
+
+
+class PagedAdjacency:
+    """Stands in for mesh['adj'] so find_path can index it by box as usual"""
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def __getitem__(self, box):
+        return self.mesh.neighbors(box)
+
+
+class PagedMesh:
+    """
+    A mesh read from a paged file, loading pages only when the search reaches them.
+
+    Loaded pages are kept in an LRU cache. When the in-memory size of the cached
+    pages goes over max_bytes, the least recently used pages are dropped.
+    page_faults and evictions count how often that happens, to help size the cache.
+
+    Only mesh['adj'] is available; there is no 'boxes' list, since that would
+    mean loading every page. Use find_box_containing_point to locate points.
+    """
+
+    def __init__(self, filename, max_bytes=64 * 1024 * 1024):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.cache = collections.OrderedDict()
+        self.cached_bytes = 0
+        self.page_faults = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        with open(filename, 'rb') as f:
+            f.seek(-8, 2)
+            index_offset, = struct.unpack('<Q', f.read(8))
+            f.seek(index_offset)
+            index = pickle.load(f)
+
+        self.page_size = index['page_size']
+        self.pages = index['pages']
+
+    def __contains__(self, key):
+        return key == 'adj'
+
+    def __getitem__(self, key):
+        if key != 'adj':
+            raise KeyError("paged meshes only support mesh['adj'], not %r" % (key,))
+        return PagedAdjacency(self)
+
+    def load_page(self, key):
+        """Get a page from the cache, reading it from disk on a miss"""
+        with self.lock:
+            return self._load_page(key)
+
+    def _load_page(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        if key not in self.pages:
+            return None
+
+        offset, length, size = self.pages[key]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            page = pickle.loads(f.read(length))
+
+        self.page_faults += 1
+        self.cache[key] = page
+        self.cached_bytes += size
+
+        # always keep the page that was just loaded
+        while self.cached_bytes > self.max_bytes and len(self.cache) > 1:
+            old_key, _ = self.cache.popitem(last=False)
+            self.cached_bytes -= self.pages[old_key][2]
+            self.evictions += 1
+
+        return page
+
+    def neighbors(self, box):
+        """Adjacency list of a box, loading the page that owns it"""
+        return self.load_page(page_of((box[0], box[2]), self.page_size))['adj'][box]
+
+    def find_box_containing_point(self, point):
+        """Find the box that contains the given point, looking only at its page"""
+        page = self.load_page(page_of(point, self.page_size))
+        if page is None:
+            return None
+        x, y = point
+        for box in page['covers']:
+            x1, x2, y1, y2 = box
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                return box
+        return None
+
+
+if __name__ == '__main__':
+
+    page_size = 64
+
+    if len(sys.argv) == 2:
+        filename = sys.argv[1]
+    elif len(sys.argv) == 3:
+        filename = sys.argv[1]
+        page_size = int(sys.argv[2])
+    else:
+        print("usage: %s mesh_filename page_size" % sys.argv[0])
+        sys.exit(-1)
+
+    with open(filename, 'rb') as f:
+        mesh = pickle.load(f)
+
+    if 'layers' in mesh:
+        print("Paging a multi-clearance mesh is not supported, build a single layer first.")
+        sys.exit(-1)
+
+    count = write_paged_mesh(mesh, filename + '.paged', page_size)
+
+    print("Wrote %d boxes in %d pages." % (len(mesh['boxes']), count))
@@ -94,6 +94,8 @@ def distance(p1, p2):
 
 def find_box_containing_point(point, mesh):
     """Find the box that contains the given point"""
+    if hasattr(mesh, 'find_box_containing_point'):
+        return mesh.find_box_containing_point(point)
     x, y = point
     for box in mesh['boxes']:
         x1, x2, y1, y2 = box
@@ -101,11 +103,33 @@ def find_box_containing_point(point, mesh):
             return box
     return None
 
-def find_path(source_point, destination_point, mesh):
+def select_layer(mesh, clearance):
+    """Pick the layer of a multi-clearance mesh for an agent of the given radius.
+
+    Plain single-layer meshes (including paged ones) are built for point agents,
+    so they are only returned when clearance is 0. For layered meshes the
+    smallest radius that is at least the clearance is used. None is returned
+    if no layer is wide enough.
+    """
+    if 'layers' not in mesh:
+        return mesh if clearance <= 0 else None
+    for radius in mesh['radii']:
+        if radius >= clearance:
+            return mesh['layers'][radius]
+    return None
+
+def find_path(source_point, destination_point, mesh, clearance=0, stop=None):
     """
     Searches for a path from source_point to destination_point through the mesh
-    using bidirectional A* search.
+    using bidirectional A* search. For multi-clearance meshes, clearance selects
+    the layer built for agents of that radius. If stop is given (for example a
+    threading.Event), the search gives up and returns no path once it is set.
     """
+    mesh = select_layer(mesh, clearance)
+    if mesh is None:
+        print("No path!")
+        return [], []
+
     # Find source and destination boxes
     source_box = find_box_containing_point(source_point, mesh)
     dest_box = find_box_containing_point(destination_point, mesh)
@@ -139,6 +163,9 @@ def find_path(source_point, destination_point, mesh):
     meeting_box = None
     
     while queue_fwd and queue_back:
+        if stop is not None and stop.is_set():
+            return [], list(visited)
+
         # Process forward search
         if queue_fwd:
             _, current_box_fwd = heappop(queue_fwd)